@@ -5,19 +5,38 @@ connections to the Familiar server, all on one port.
 This avoids iOS Safari blocking cross-port ws:// connections.
 
 Usage: python3 serve.py [--port 8090] [--ws-target localhost:8385]
+
+If uvloop is installed (pip install uvloop) it is used as the event loop.
+websockets should be installed from a binary wheel (or built with a C
+compiler) so frame masking uses its C speedups module.
 """
 
 import asyncio
 import argparse
+import dataclasses
 import mimetypes
+import os
+import posixpath
+import stat
+from functools import lru_cache
 from pathlib import Path
 from http import HTTPStatus
 
 import websockets
+import websockets.frames
+import websockets.utils
 from websockets.asyncio.server import serve as ws_serve
 from websockets.http11 import Response
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 STATIC_DIR = Path(__file__).parent
+STATIC_ROOT = str(STATIC_DIR.resolve()) + os.sep
+STREAM_THRESHOLD = 64 * 1024  # files larger than this go out via sendfile
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024  # base64 attachments easily exceed the 1 MiB default
 
 
 async def process_request(connection, request):
@@ -31,47 +50,107 @@ async def process_request(connection, request):
     if req_path == '/':
         req_path = '/index.html'
 
-    file_path = (STATIC_DIR / req_path.lstrip('/')).resolve()
-
-    # Security check
-    if not str(file_path).startswith(str(STATIC_DIR.resolve())):
+    # Security check — normalise lexically and refuse anything that climbs
+    # out of STATIC_ROOT, without touching the filesystem
+    rel = posixpath.normpath(req_path).lstrip('/')
+    if '..' in rel.split('/'):
         return Response(HTTPStatus.FORBIDDEN, "Forbidden\n", websockets.Headers())
+    file_path = os.path.join(STATIC_ROOT, rel)
 
-    if file_path.is_file():
-        content_type = mimetypes.guess_type(str(file_path))[0] or 'application/octet-stream'
-        body = file_path.read_bytes()
-        headers = websockets.Headers({
-            "Content-Type": content_type,
-            "Content-Length": str(len(body)),
-            "Cache-Control": "no-cache",
-        })
-        return Response(HTTPStatus.OK, "", headers, body)
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        st = None
+
+    if st is not None and stat.S_ISREG(st.st_mode):
+        if st.st_size > STREAM_THRESHOLD:
+            headers = websockets.Headers({
+                "Content-Type": content_type_for(file_path),
+                "Content-Length": str(st.st_size),
+                "Cache-Control": "no-cache",
+            })
+            return await send_file(connection, file_path, headers)
+        response = load_static(file_path, st.st_mtime_ns)
+        # websockets adds a Server header to whatever we return, so hand it a
+        # copy of the headers and keep the cached Response pristine.
+        return dataclasses.replace(response, headers=response.headers.copy())
 
     return Response(HTTPStatus.NOT_FOUND, "Not Found\n", websockets.Headers())
 
 
+@lru_cache(maxsize=1024)
+def content_type_for(path_str):
+    return mimetypes.guess_type(path_str)[0] or 'application/octet-stream'
+
+
+@lru_cache(maxsize=256)
+def load_static(path_str, mtime_ns):
+    """Build the Response for a small static file.
+
+    Keyed on mtime so an edited file misses the cache and gets re-read.
+    """
+    with open(path_str, 'rb') as f:
+        body = f.read()
+    headers = websockets.Headers({
+        "Content-Type": content_type_for(path_str),
+        "Content-Length": str(len(body)),
+        "Cache-Control": "no-cache",
+    })
+    return Response(HTTPStatus.OK, "", headers, body)
+
+
+async def send_file(connection, file_path, headers):
+    """Stream a large file straight to the socket with loop.sendfile.
+
+    Headers go out first, then the kernel copies the file without it passing
+    through Python memory. The connection is closed once the body is sent, so
+    the Response returned to websockets is never written.
+    """
+    headers["Connection"] = "close"
+    transport = connection.transport
+    transport.write(Response(HTTPStatus.OK, "OK", headers).serialize())
+    with open(file_path, 'rb') as f:
+        try:
+            await asyncio.get_running_loop().sendfile(transport, f)
+        except NotImplementedError:
+            # uvloop has no sendfile; stream in chunks with flow control
+            while chunk := f.read(STREAM_THRESHOLD):
+                transport.write(chunk)
+                await connection.drain()
+    transport.close()
+    await connection.connection_lost_waiter
+    return Response(HTTPStatus.OK, "OK", headers)
+
+
+async def pump(source, sink):
+    """Forward every message from source to sink until either side closes.
+
+    recv() hands back already-buffered messages without yielding and send()
+    only waits when the sink's write buffer is full, so a burst is forwarded
+    in a single pass of the event loop while backpressure still reaches the
+    sender.
+
+    The Familiar protocol is JSON text only, so payloads are relayed as raw
+    bytes in text frames: no UTF-8 decode/validate here and no re-encode on
+    the way out. The browser and the Familiar server validate at the ends.
+    """
+    try:
+        while True:
+            await sink.send(await source.recv(decode=False), text=True)
+    except websockets.exceptions.ConnectionClosed:
+        pass
+
+
 async def proxy_handler(websocket, ws_target):
     """Proxy WebSocket messages between client and Familiar server."""
     uri = f"ws://{ws_target}"
     try:
-        async with websockets.connect(uri) as upstream:
-            async def client_to_server():
-                try:
-                    async for msg in websocket:
-                        await upstream.send(msg)
-                except websockets.exceptions.ConnectionClosed:
-                    pass
-
-            async def server_to_client():
-                try:
-                    async for msg in upstream:
-                        await websocket.send(msg)
-                except websockets.exceptions.ConnectionClosed:
-                    pass
-
+        async with websockets.connect(
+            uri, compression=None, max_size=MAX_MESSAGE_SIZE,
+        ) as upstream:
             done, pending = await asyncio.wait(
-                [asyncio.create_task(client_to_server()),
-                 asyncio.create_task(server_to_client())],
+                [asyncio.create_task(pump(websocket, upstream)),
+                 asyncio.create_task(pump(upstream, websocket))],
                 return_when=asyncio.FIRST_COMPLETED,
             )
             for task in pending:
@@ -89,6 +168,8 @@ async def run_server(port, ws_target):
         "0.0.0.0",
         port,
         process_request=process_request,
+        compression=None,
+        max_size=MAX_MESSAGE_SIZE,
     ) as server:
         print(f"Familiar Mini serving on http://0.0.0.0:{port}")
         print(f"WebSocket proxy → ws://{ws_target}")
@@ -100,6 +181,10 @@ def main():
     parser.add_argument('--port', type=int, default=8090, help='Port to serve on')
     parser.add_argument('--ws-target', default='localhost:8385', help='Familiar WebSocket server')
     args = parser.parse_args()
+    if websockets.frames.apply_mask is websockets.utils.apply_mask:
+        print("Warning: websockets C speedups not available, frame masking runs in pure Python")
+    if uvloop is not None:
+        uvloop.install()
     asyncio.run(run_server(args.port, args.ws_target))
 
 
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 """Generate Familiar app icon at all required sizes with pixel cat drawn programmatically."""
 
-from PIL import Image, ImageDraw
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+import numpy as np
 import os
 
 def draw_pixel_cat(size):
@@ -9,11 +11,10 @@ def draw_pixel_cat(size):
 
     The cat is defined on a 20x13 pixel grid to capture ears, head, whiskers, and jaw.
     """
-    img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(img)
+    buf = np.empty((size, size, 4), np.uint8)
 
     bg_color = (248, 245, 240, 255)  # warm off-white
-    draw.rectangle([0, 0, size, size], fill=bg_color)
+    buf[:] = bg_color
 
     # 20 columns x 13 rows grid
     grid_w, grid_h = 20, 13
@@ -64,12 +65,13 @@ def draw_pixel_cat(size):
         (9, 15, 3, 1),  # bottom whisker
     ]
 
+    # Slices end one past x2/y2 to match ImageDraw.rectangle, which includes both edges
     for (r, c, w, h) in cat_blocks:
         x1 = ox + c * block
         y1 = oy + r * block
         x2 = x1 + w * block
         y2 = y1 + h * block
-        draw.rectangle([x1, y1, x2, y2], fill=black)
+        buf[y1:y2 + 1, x1:x2 + 1] = black
 
     # Eyes (yellow squares) — positioned in the middle of the head
     eye_positions = [(7, 7), (7, 12)]
@@ -78,9 +80,9 @@ def draw_pixel_cat(size):
         y1 = oy + r * block
         x2 = x1 + block
         y2 = y1 + block
-        draw.rectangle([x1, y1, x2, y2], fill=yellow)
+        buf[y1:y2 + 1, x1:x2 + 1] = yellow
 
-    return img
+    return Image.fromarray(buf, 'RGBA')
 
 
 def main():
@@ -91,15 +93,21 @@ def main():
 
     sizes = [16, 32, 64, 128, 256, 512, 1024]
 
-    for s in sizes:
+    # Render once at full size; every icon is a downsample of this master
+    master = draw_pixel_cat(1024)
+
+    def save_size(s):
         # Always use NEAREST for pixel art crispness
-        render_size = max(s, 1024)
-        img = draw_pixel_cat(render_size)
-        img = img.resize((s, s), Image.NEAREST)
+        img = master.resize((s, s), Image.NEAREST)
 
         path = os.path.join(icon_dir, f"icon_{s}x{s}.png")
         img.save(path, "PNG")
-        print(f"  Generated {s}x{s}")
+        return s
+
+    # PNG encoding releases the GIL, so the sizes encode in parallel
+    with ThreadPoolExecutor(max_workers=min(len(sizes), os.cpu_count() or 1)) as pool:
+        for s in pool.map(save_size, sizes):
+            print(f"  Generated {s}x{s}")
 
     print("Done!")
 
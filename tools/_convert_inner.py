@@ -3,16 +3,21 @@
 
 import os
 import shutil
+import subprocess
+from pathlib import Path
 import numpy as np
 import torch
 import torch.nn as nn
 import coremltools as ct
+import coremltools.optimize.coreml as cto
 from transformers import AutoModel, AutoTokenizer
 
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 SEQ_LEN = 128
 OUTPUT_DIR = os.path.expanduser("~/.familiar/knowledge")
 OUTPUT_PATH = os.path.join(OUTPUT_DIR, "MiniLM.mlpackage")
+INT8_OUTPUT_PATH = os.path.join(OUTPUT_DIR, "MiniLM_int8.mlpackage")
+INT8_MIN_COSINE = 0.995
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 print(f"torch={torch.__version__}, coremltools={ct.__version__}")
@@ -62,29 +67,78 @@ mlmodel = ct.convert(
     outputs=[ct.TensorType(name="embedding")],
     minimum_deployment_target=ct.target.macOS15,
     compute_precision=ct.precision.FLOAT16,
+    # Only applies to the MLModel returned here (used for validation below);
+    # compute units are not saved into the .mlpackage or .mlmodelc
+    compute_units=ct.ComputeUnit.CPU_AND_NE,
 )
 
-if os.path.exists(OUTPUT_PATH):
-    shutil.rmtree(OUTPUT_PATH)
-mlmodel.save(OUTPUT_PATH)
-model_size = sum(f.stat().st_size for f in __import__('pathlib').Path(OUTPUT_PATH).rglob('*') if f.is_file())
-print(f"CoreML saved: {model_size / 1024 / 1024:.1f} MB -> {OUTPUT_PATH}")
+def save_package(mlmodel, path):
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    mlmodel.save(path)
+    size = sum(f.stat().st_size for f in Path(path).rglob('*') if f.is_file())
+    print(f"CoreML saved: {size / 1024 / 1024:.1f} MB -> {path}")
+
+
+def compile_package(path):
+    """Precompile an .mlpackage to .mlmodelc next to it.
+
+    Loading the compiled model skips the on-device compile step, which is most
+    of the first-inference latency. Loaders should prefer MiniLM.mlmodelc (or
+    MiniLM_int8.mlmodelc) when present and fall back to the .mlpackage. The
+    compiled model carries no compute-unit preference, so loaders must set
+    MLModelConfiguration.computeUnits = .cpuAndNeuralEngine themselves.
+    """
+    compiled = os.path.splitext(path)[0] + ".mlmodelc"
+    if os.path.exists(compiled):
+        shutil.rmtree(compiled)
+    try:
+        subprocess.check_call(["xcrun", "coremlcompiler", "compile", path, OUTPUT_DIR])
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Could not compile {path}: {e}")
+        return
+    print(f"Compiled -> {compiled}")
+
+
+def cosine_vs_reference(mlmodel):
+    """Cosine similarity between the CoreML and PyTorch embeddings of a test sentence."""
+    test_text = "This is a test sentence for semantic search."
+    enc = tokenizer(test_text, padding="max_length", max_length=SEQ_LEN, truncation=True, return_tensors="pt")
+
+    with torch.no_grad():
+        pt_emb = wrapped(enc["input_ids"].int(), enc["attention_mask"].int()).numpy().flatten()
+
+    pred = mlmodel.predict({
+        "input_ids": enc["input_ids"].numpy().astype(np.int32),
+        "attention_mask": enc["attention_mask"].numpy().astype(np.int32),
+    })
+    cml_emb = pred["embedding"].flatten()
+    return np.dot(pt_emb, cml_emb) / (np.linalg.norm(pt_emb) * np.linalg.norm(cml_emb)), len(cml_emb)
+
+
+save_package(mlmodel, OUTPUT_PATH)
+compile_package(OUTPUT_PATH)
 
 # Validate
 print("Validating...")
-test_text = "This is a test sentence for semantic search."
-enc = tokenizer(test_text, padding="max_length", max_length=SEQ_LEN, truncation=True, return_tensors="pt")
-
-with torch.no_grad():
-    pt_emb = wrapped(enc["input_ids"].int(), enc["attention_mask"].int()).numpy().flatten()
-
-pred = mlmodel.predict({
-    "input_ids": enc["input_ids"].numpy().astype(np.int32),
-    "attention_mask": enc["attention_mask"].numpy().astype(np.int32),
-})
-cml_emb = pred["embedding"].flatten()
-
-cos_sim = np.dot(pt_emb, cml_emb) / (np.linalg.norm(pt_emb) * np.linalg.norm(cml_emb))
+cos_sim, dim = cosine_vs_reference(mlmodel)
 print(f"Cosine similarity: {cos_sim:.6f}")
-print(f"Embedding dim: {len(cml_emb)}")
+print(f"Embedding dim: {dim}")
+
+# INT8 weights halve the FP16 package and load faster; only kept if the
+# quantized model still tracks the PyTorch reference
+print("Quantizing weights to INT8...")
+int8_model = cto.linear_quantize_weights(mlmodel, config=cto.OptimizationConfig(
+    global_config=cto.OpLinearQuantizerConfig(mode="linear_symmetric", dtype="int8"),
+))
+int8_sim, _ = cosine_vs_reference(int8_model)
+print(f"INT8 cosine similarity: {int8_sim:.6f}")
+if int8_sim >= INT8_MIN_COSINE:
+    save_package(int8_model, INT8_OUTPUT_PATH)
+    compile_package(INT8_OUTPUT_PATH)
+else:
+    print(f"INT8 below {INT8_MIN_COSINE}, not saving")
+    for stale in (INT8_OUTPUT_PATH, os.path.splitext(INT8_OUTPUT_PATH)[0] + ".mlmodelc"):
+        if os.path.exists(stale):
+            shutil.rmtree(stale)
 print("Done!")
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Embedding worker for embed-knowledge.py — loads the model once, then serves batches.
+
+Reads a batch size per line on stdin, embeds that many NULL-vector chunks and
+prints one JSON result line per batch. Exits when stdin closes.
+"""
+
+import json
+import sqlite3
+import struct
+import sys
+
+import NaturalLanguage
+import objc
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+db = sqlite3.connect(sys.argv[1])
+db.execute("PRAGMA journal_mode=WAL")
+db.execute("PRAGMA synchronous=NORMAL")
+emb = NaturalLanguage.NLContextualEmbedding.contextualEmbeddingForLanguage_("en")
+ok, err = emb.loadWithError_(None)
+if not ok:
+    print(json.dumps({"error": str(err)}), flush=True)
+    sys.exit(1)
+
+dim = emb.sentenceVectorDimension()
+
+for line in sys.stdin:
+    batch_size = int(line)
+    rows = db.execute("SELECT id, text FROM chunks WHERE vector IS NULL LIMIT ?", (batch_size,)).fetchall()
+
+    updates = []
+    # Drain ObjC temporaries every batch so a long-lived worker doesn't grow
+    with objc.autorelease_pool():
+        for chunk_id, text in rows:
+            vec = emb.sentenceEmbeddingVectorForString_language_error_(text[:512], "en", None)
+            if vec and len(vec) == dim:
+                if np is not None:
+                    blob = np.fromiter(vec, dtype=np.float32, count=dim).tobytes()
+                else:
+                    blob = struct.pack(f"{dim}f", *vec)
+                updates.append((blob, chunk_id))
+
+    # One transaction for the whole batch
+    db.executemany("UPDATE chunks SET vector = ? WHERE id = ?", updates)
+    db.commit()
+    print(json.dumps({"embedded": len(updates), "processed": len(rows)}), flush=True)
+
+db.close()
@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 """Backfill vector embeddings using Apple NLContextualEmbedding (BERT, 768-dim).
 
-Uses subprocess isolation — each worker embeds a batch then exits,
-preventing ObjC memory accumulation from crashing the process.
+Uses subprocess isolation — a long-lived worker (_embed_worker.py) loads the
+model once and embeds batches on request. It is recycled every few batches and
+restarted if it crashes, so ObjC memory accumulation can't take down the process.
 """
 
 import json
+import os
+import select
 import sqlite3
 import subprocess
 import sys
@@ -14,32 +17,42 @@ import time
 DB_PATH = "/Users/mattkennelly/.familiar/knowledge/knowledge.db"
 BATCH_SIZE = 2000  # ~600MB peak per worker, well within limits
 
-WORKER_SCRIPT = '''
-import json, sqlite3, struct, sys
-import NaturalLanguage
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_embed_worker.py")
+BATCH_TIMEOUT = 600  # seconds to wait for one batch before killing the worker
+BATCHES_PER_WORKER = 10  # recycle the worker periodically anyway
 
-db = sqlite3.connect(sys.argv[1])
-emb = NaturalLanguage.NLContextualEmbedding.contextualEmbeddingForLanguage_("en")
-ok, err = emb.loadWithError_(None)
-if not ok:
-    print(json.dumps({"error": str(err)}))
-    sys.exit(1)
 
-dim = emb.sentenceVectorDimension()
-rows = db.execute("SELECT id, text FROM chunks WHERE vector IS NULL LIMIT ?", (int(sys.argv[2]),)).fetchall()
+def start_worker():
+    return subprocess.Popen(
+        [sys.executable, WORKER, DB_PATH],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
 
-count = 0
-for chunk_id, text in rows:
-    vec = emb.sentenceEmbeddingVectorForString_language_error_(text[:512], "en", None)
-    if vec and len(vec) == dim:
-        blob = struct.pack(f"{dim}f", *[float(vec[i]) for i in range(dim)])
-        db.execute("UPDATE chunks SET vector = ? WHERE id = ?", (blob, chunk_id))
-        count += 1
 
-db.commit()
-db.close()
-print(json.dumps({"embedded": count, "processed": len(rows)}))
-'''
+def stop_worker(worker):
+    try:
+        worker.stdin.close()
+    except BrokenPipeError:
+        pass
+    try:
+        worker.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        worker.kill()
+        worker.wait()
+
+
+def run_batch(worker):
+    """Ask the worker for one batch. Returns its output line, or None if it died or hung."""
+    try:
+        worker.stdin.write(f"{BATCH_SIZE}\n")
+        worker.stdin.flush()
+    except BrokenPipeError:
+        return None
+    ready, _, _ = select.select([worker.stdout], [], [], BATCH_TIMEOUT)
+    if not ready:
+        worker.kill()
+        return None
+    return worker.stdout.readline() or None
 
 
 def main():
@@ -55,28 +68,36 @@ def main():
     done = 0
     start = time.time()
     retries = 0
+    worker = None
+    batches = 0
 
     while done < total:
-        result = subprocess.run(
-            [sys.executable, "-c", WORKER_SCRIPT, DB_PATH, str(BATCH_SIZE)],
-            capture_output=True, text=True, timeout=600
-        )
-
-        if result.returncode != 0:
+        if worker is None:
+            worker = start_worker()
+            batches = 0
+
+        output = run_batch(worker)
+        if output is None:
+            stop_worker(worker)
+            worker = None
             retries += 1
-            err = result.stderr.strip()[:200]
-            print(f"Worker crashed (attempt {retries}): {err}")
+            print(f"Worker crashed (attempt {retries})")
             if retries > 5:
                 print("Too many failures, stopping.")
                 break
             time.sleep(2)
             continue
 
+        batches += 1
+        if batches >= BATCHES_PER_WORKER:
+            stop_worker(worker)
+            worker = None
+
         retries = 0
         try:
-            info = json.loads(result.stdout.strip())
+            info = json.loads(output.strip())
         except (json.JSONDecodeError, ValueError):
-            print(f"Bad output: {result.stdout.strip()[:200]}")
+            print(f"Bad output: {output.strip()[:200]}")
             break
 
         if "error" in info:
@@ -92,6 +113,9 @@ def main():
         remaining = (total - done) / rate if rate > 0 else 0
         print(f"  {done}/{total} ({done*100//total}%) — {rate:.0f}/sec — ~{remaining/60:.0f}min left", flush=True)
 
+    if worker is not None:
+        stop_worker(worker)
+
     elapsed = time.time() - start
     print(f"\nDone! Embedded {done} chunks in {elapsed/60:.1f} minutes")
 
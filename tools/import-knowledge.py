@@ -13,23 +13,52 @@ Usage:
 
 import json
 import os
+import re
 import sqlite3
 import sys
 import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 from time import time
 
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
 # Config
 KNOWLEDGE_DIR = Path.home() / ".familiar" / "knowledge"
 DB_PATH = KNOWLEDGE_DIR / "knowledge.db"
 MIN_HUMAN_MESSAGES = 5
 MAX_FILE_SIZE = 50_000_000  # 50MB
+COMMIT_EVERY = 50  # sessions per transaction during bulk import
+BULK_FTS_THRESHOLD = 500  # sessions; larger imports rebuild the FTS index once at the end
+
+FTS_TRIGGERS = """
+    CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+        INSERT INTO chunks_fts(rowid, text) VALUES (new.rowid, new.text);
+    END;
+    CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+        INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES('delete', old.rowid, old.text);
+    END;
+"""
 
 def init_db():
     KNOWLEDGE_DIR.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(str(DB_PATH))
     conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # WAL stays consistent; only skips the fsync per commit
+    conn.execute("PRAGMA cache_size=-65536")  # 64MB page cache
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")  # 256MB
     conn.execute("PRAGMA foreign_keys = ON")
+    # chunks_ai is only ever missing because an import died mid-bulk-load
+    # (see deferred_fts); chunks committed since then never reached the index
+    existing = {r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE name IN ('chunks', 'chunks_ai')"
+    )}
+    fts_stale = existing == {"chunks"}
     conn.executescript("""
         CREATE TABLE IF NOT EXISTS documents (
             id TEXT PRIMARY KEY,
@@ -49,106 +78,210 @@ def init_db():
         CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
             text, content=chunks, content_rowid=rowid
         );
-        CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
-            INSERT INTO chunks_fts(rowid, text) VALUES (new.rowid, new.text);
-        END;
-        CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
-            INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES('delete', old.rowid, old.text);
-        END;
     """)
+    if fts_stale:
+        print("Rebuilding full-text index after an interrupted import...")
+        conn.execute("INSERT INTO chunks_fts(chunks_fts) VALUES('rebuild')")
+    conn.executescript(FTS_TRIGGERS)
+    try:
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_source_path "
+            "ON documents(source_path) WHERE source_path IS NOT NULL"
+        )
+    except sqlite3.IntegrityError:
+        # Older databases can hold the same file twice (repeated --file imports)
+        print("Warning: duplicate source paths in knowledge.db; re-imports won't be rejected")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_source_path_dups ON documents(source_path)")
     conn.commit()
     return conn
 
 
-def existing_source_paths(conn):
-    rows = conn.execute("SELECT source_path FROM documents WHERE source_path IS NOT NULL").fetchall()
-    return {r[0] for r in rows}
+@contextmanager
+def deferred_fts(conn, batch_size):
+    """Keep the FTS insert trigger off while a large batch is imported.
+
+    Tokenizing every chunk as it is inserted dominates bulk loads; a single
+    'rebuild' at the end is much cheaper, but it re-indexes the whole corpus
+    and holds the write lock meanwhile, so small incremental runs keep the
+    trigger. Only chunks_ai is dropped so deletes made by the app meanwhile
+    still reach chunks_fts. If we die before the trigger is restored, init_db
+    notices it missing and rebuilds on the next run.
+    """
+    if batch_size < BULK_FTS_THRESHOLD:
+        yield
+        return
+
+    conn.execute("DROP TRIGGER IF EXISTS chunks_ai")
+    conn.commit()
+    try:
+        yield
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("INSERT INTO chunks_fts(chunks_fts) VALUES('rebuild')")
+        conn.executescript(FTS_TRIGGERS)
+        conn.commit()
+
+
+def already_imported(conn, source_path):
+    row = conn.execute("SELECT 1 FROM documents WHERE source_path = ?", (source_path,)).fetchone()
+    return row is not None
 
 
-def parse_cc_jsonl(path):
-    """Stream-parse a Claude Code JSONL file, extracting human + assistant text only."""
+def parse_cc_jsonl(raw):
+    """Parse the bytes of a Claude Code JSONL file, extracting human + assistant text only."""
     messages = []
-    with open(path, 'r', encoding='utf-8', errors='replace') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
+    for line in raw.splitlines():
+        # The JSON parser ignores surrounding whitespace, so only skip empties
+        if not line:
+            continue
+        try:
+            obj = json_loads(line)
+        except ValueError:
+            # Invalid UTF-8 somewhere in the line; parse it lossily
             try:
-                obj = json.loads(line)
-            except json.JSONDecodeError:
+                obj = json.loads(line.decode('utf-8', errors='replace'))
+            except ValueError:
                 continue
 
-            msg_type = obj.get("type")
-            msg = obj.get("message", {})
-
-            if msg_type == "user":
-                content = msg.get("content")
-                if isinstance(content, str) and content.strip():
-                    messages.append(("Human", content))
-            elif msg_type == "assistant":
-                content = msg.get("content")
-                if isinstance(content, list):
-                    text_parts = []
-                    for block in content:
-                        if isinstance(block, dict) and block.get("type") == "text":
-                            t = block.get("text", "")
-                            if t.strip():
-                                text_parts.append(t)
-                    if text_parts:
-                        messages.append(("Assistant", "\n".join(text_parts)))
+        msg_type = obj.get("type")
+        msg = obj.get("message", {})
+
+        if msg_type == "user":
+            content = msg.get("content")
+            if isinstance(content, str) and content.strip():
+                messages.append(("Human", content))
+        elif msg_type == "assistant":
+            content = msg.get("content")
+            if isinstance(content, list):
+                text_parts = []
+                for block in content:
+                    if isinstance(block, dict) and block.get("type") == "text":
+                        t = block.get("text", "")
+                        if t.strip():
+                            text_parts.append(t)
+                if text_parts:
+                    messages.append(("Assistant", "\n".join(text_parts)))
     return messages
 
 
+_PARA_RE = re.compile(r"\n\n+")
+_SENT_RE = re.compile(r"(?<=\.) |\n")  # after a full stop, or any line break
+
+
 def chunk_text(text):
     """Split text into ~500-token chunks (approximated by characters)."""
-    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
     chunks = []
-    buffer = ""
+    # Pending short paragraphs; joined only when flushed
+    buf_parts = []
+    buf_len = 0
 
-    for para in paragraphs:
+    for para in _PARA_RE.split(text):
+        para = para.strip()
+        if not para:
+            continue
         if len(para) > 800:
-            if buffer:
-                chunks.append(buffer)
-                buffer = ""
+            if buf_len:
+                chunks.append("\n\n".join(buf_parts))
+                buf_parts, buf_len = [], 0
             # Split long paragraphs by sentences (rough)
-            sentences = para.replace(". ", ".\n").split("\n")
-            sent_buf = ""
-            for sent in sentences:
-                if len(sent_buf) + len(sent) > 600:
-                    if sent_buf:
-                        chunks.append(sent_buf)
-                    sent_buf = sent
+            sent_parts = []
+            sent_len = 0
+            for sent in _SENT_RE.split(para):
+                if sent_len + len(sent) > 600:
+                    if sent_len:
+                        chunks.append(" ".join(sent_parts))
+                    sent_parts, sent_len = [sent], len(sent)
+                elif sent_len:
+                    sent_parts.append(sent)
+                    sent_len += 1 + len(sent)
                 else:
-                    sent_buf += (" " if sent_buf else "") + sent
-            if sent_buf:
-                chunks.append(sent_buf)
-        elif len(buffer) + len(para) < 100:
-            buffer += ("\n\n" if buffer else "") + para
+                    sent_parts, sent_len = [sent], len(sent)
+            if sent_len:
+                chunks.append(" ".join(sent_parts))
+        elif buf_len + len(para) < 100:
+            if buf_len:
+                buf_parts.append(para)
+                buf_len += 2 + len(para)
+            else:
+                buf_parts, buf_len = [para], len(para)
         else:
-            if buffer:
-                chunks.append(buffer)
-            buffer = para
+            if buf_len:
+                chunks.append("\n\n".join(buf_parts))
+            buf_parts, buf_len = [para], len(para)
 
-    if buffer:
-        chunks.append(buffer)
+    if buf_len:
+        chunks.append("\n\n".join(buf_parts))
     return chunks
 
 
 def insert_document(conn, doc_id, filename, source_type, source_path=None, source_mod_date=None):
+    """Insert a document row. Returns False if source_path was already imported."""
     import time as _time
-    conn.execute(
-        "INSERT INTO documents (id, filename, import_date, source_type, source_path, source_mod_date) VALUES (?, ?, ?, ?, ?, ?)",
+    row = conn.execute(
+        "INSERT INTO documents (id, filename, import_date, source_type, source_path, source_mod_date) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT DO NOTHING RETURNING id",
         (doc_id, filename, _time.time(), source_type, source_path, source_mod_date)
-    )
+    ).fetchone()
+    return row is not None
 
 
 def insert_chunks(conn, chunks, document_id):
+    # Chunk ids stay TEXT UUIDs: the Swift importer (tools/import-knowledge)
+    # writes the same database and inserts UUID strings
     conn.executemany(
         "INSERT INTO chunks (id, document_id, text, vector) VALUES (?, ?, ?, NULL)",
         [(str(uuid.uuid4()), document_id, text) for text in chunks]
     )
 
 
+def prepare_cc_session(fpath):
+    """Parse and chunk one transcript (given as a path string) in a worker process.
+
+    Returns (display_name, mod_date, chunks), or None if the file is skipped.
+    """
+    # Skip huge files
+    try:
+        st = os.stat(fpath)
+    except OSError:
+        return None
+    if st.st_size > MAX_FILE_SIZE:
+        return None
+
+    try:
+        with open(fpath, 'rb') as f:
+            raw = f.read()
+    except OSError:
+        return None
+
+    # Cheap upper bound on human turns before parsing any JSON: every user
+    # line carries this marker (Claude Code writes compact JSON), so files
+    # that can't reach the threshold are dropped after a single read
+    if raw.count(b'"type":"user"') < MIN_HUMAN_MESSAGES:
+        return None
+
+    try:
+        messages = parse_cc_jsonl(raw)
+    except Exception:
+        return None
+
+    human_count = sum(1 for r, _ in messages if r == "Human")
+    if human_count < MIN_HUMAN_MESSAGES:
+        return None
+
+    transcript = "\n\n".join(f"[{role}]\n{text}" for role, text in messages)
+    chunks = chunk_text(transcript)
+    if not chunks:
+        return None
+
+    parent, filename = os.path.split(fpath)
+    project_dir = os.path.basename(parent)
+    session_id = os.path.splitext(filename)[0]
+    display_name = f"claude-code/{project_dir}/{session_id}"
+    return display_name, st.st_mtime, chunks
+
+
 def import_claude_code(conn, directory):
     directory = Path(directory)
     jsonl_files = sorted(directory.rglob("*.jsonl"))
@@ -156,8 +289,10 @@ def import_claude_code(conn, directory):
         print(f"No .jsonl files found under {directory}")
         return
 
-    existing = existing_source_paths(conn)
-    to_process = [f for f in jsonl_files if str(f) not in existing]
+    # Plain strings from here on: the dedup key, the worker argument and source_path.
+    # Each check is a lookup on idx_documents_source_path, so already-imported
+    # files are never handed to the parser
+    to_process = [f for f in map(str, jsonl_files) if not already_imported(conn, f)]
 
     print(f"Found {len(jsonl_files)} total transcripts, {len(to_process)} new")
     if not to_process:
@@ -167,53 +302,30 @@ def import_claude_code(conn, directory):
     skipped = 0
     start = time()
 
-    for i, fpath in enumerate(to_process):
-        # Skip huge files
-        try:
-            size = fpath.stat().st_size
-        except OSError:
-            skipped += 1
-            continue
-        if size > MAX_FILE_SIZE:
-            skipped += 1
-            if (i + 1) % 100 == 0:
-                print(f"  [{i+1}/{len(to_process)}] imported: {imported}, skipped: {skipped}")
-            continue
-
-        try:
-            messages = parse_cc_jsonl(str(fpath))
-        except Exception:
-            skipped += 1
-            continue
-
-        human_count = sum(1 for r, _ in messages if r == "Human")
-        if human_count < MIN_HUMAN_MESSAGES:
-            skipped += 1
-            if (i + 1) % 100 == 0:
-                print(f"  [{i+1}/{len(to_process)}] imported: {imported}, skipped: {skipped}")
-            continue
-
-        transcript = "\n\n".join(f"[{role}]\n{text}" for role, text in messages)
-        chunks = chunk_text(transcript)
-        if not chunks:
-            skipped += 1
-            continue
-
-        project_dir = fpath.parent.name
-        session_id = fpath.stem
-        display_name = f"claude-code/{project_dir}/{session_id}"
-        doc_id = str(uuid.uuid4())
-        mod_date = fpath.stat().st_mtime
+    # Parsing and chunking fan out across cores; SQLite writes stay here
+    with deferred_fts(conn, len(to_process)), ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        results = pool.map(prepare_cc_session, to_process, chunksize=16)
+        for i, (fpath, result) in enumerate(zip(to_process, results)):
+            if result is None:
+                skipped += 1
+                if (i + 1) % 100 == 0:
+                    print(f"  [{i+1}/{len(to_process)}] imported: {imported}, skipped: {skipped}")
+                continue
 
-        insert_document(conn, doc_id, display_name, "claude_code", str(fpath), mod_date)
-        insert_chunks(conn, chunks, doc_id)
-        conn.commit()
-        imported += 1
+            display_name, mod_date, chunks = result
+            doc_id = str(uuid.uuid4())
+            if not insert_document(conn, doc_id, display_name, "claude_code", fpath, mod_date):
+                skipped += 1
+                continue
+            insert_chunks(conn, chunks, doc_id)
+            imported += 1
+            if imported % COMMIT_EVERY == 0:
+                conn.commit()
 
-        if (i + 1) % 10 == 0:
-            elapsed = time() - start
-            rate = imported / elapsed if elapsed > 0 else 0
-            print(f"  [{i+1}/{len(to_process)}] imported: {imported}, skipped: {skipped} ({rate:.1f}/s)")
+            if (i + 1) % 10 == 0:
+                elapsed = time() - start
+                rate = imported / elapsed if elapsed > 0 else 0
+                print(f"  [{i+1}/{len(to_process)}] imported: {imported}, skipped: {skipped} ({rate:.1f}/s)")
 
     conn.commit()
     elapsed = time() - start
@@ -230,23 +342,24 @@ def import_claude_ai(conn, json_path):
     print(f"Found {len(conversations)} conversations, {len(eligible)} with >= {MIN_HUMAN_MESSAGES} human messages")
 
     imported = 0
-    for i, conv in enumerate(eligible):
-        transcript = "\n\n".join(
-            f"[{'Human' if m['sender'] == 'human' else 'Assistant'}]\n{m['text']}"
-            for m in conv["chat_messages"]
-        )
-        chunks = chunk_text(transcript)
-        if not chunks:
-            continue
+    with deferred_fts(conn, len(eligible)):
+        for i, conv in enumerate(eligible):
+            transcript = "\n\n".join(
+                f"[{'Human' if m['sender'] == 'human' else 'Assistant'}]\n{m['text']}"
+                for m in conv["chat_messages"]
+            )
+            chunks = chunk_text(transcript)
+            if not chunks:
+                continue
 
-        doc_id = str(uuid.uuid4())
-        name = conv.get("name", "Untitled")
-        insert_document(conn, doc_id, f"claude.ai: {name}", "claude_ai")
-        insert_chunks(conn, chunks, doc_id)
-        imported += 1
+            doc_id = str(uuid.uuid4())
+            name = conv.get("name", "Untitled")
+            insert_document(conn, doc_id, f"claude.ai: {name}", "claude_ai")
+            insert_chunks(conn, chunks, doc_id)
+            imported += 1
 
-        if (i + 1) % 10 == 0:
-            print(f"  [{i+1}/{len(eligible)}] imported: {imported}")
+            if (i + 1) % 10 == 0:
+                print(f"  [{i+1}/{len(eligible)}] imported: {imported}")
 
     conn.commit()
     print(f"Done! Imported {imported} Claude.ai conversations")
@@ -261,7 +374,9 @@ def import_file(conn, file_path):
         return
 
     doc_id = str(uuid.uuid4())
-    insert_document(conn, doc_id, path.name, "file", str(path))
+    if not insert_document(conn, doc_id, path.name, "file", str(path)):
+        print(f"{path.name} is already in the knowledge base")
+        return
     insert_chunks(conn, chunks, doc_id)
     conn.commit()
     print(f"Imported {path.name} — {len(chunks)} chunks")